@@ -2,20 +2,34 @@ from dash import Dash
 from dash import dcc
 from dash import html
 from dash.dependencies import Input, Output
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
+import os
 import pandas as pd
 import numpy as np
+import plotly
 import plotly.graph_objs as go
 import plotly.express as px
 
+from figure_cache import FigureCache, code_version, data_version
+
 pd.set_option("display.max_colwidth", 255)
 
 
 # DATA
-df = pd.read_csv("datasets/manomano-dataset-nps.csv")
-df_transaction = pd.read_csv("datasets/nouvelle_date.csv")
+DATASETS = {
+    "nps": "datasets/manomano-dataset-nps.csv",
+    "transaction": "datasets/nouvelle_date.csv",
+    "trustpilot": "datasets/trustpilot_sentiment_final.csv",
+    "twitter": "datasets/twitter_sentiment_final.csv",
+    "manomano": "datasets/dataset_sentiment_final.csv",
+}
+DATA_VERSION = data_version(*DATASETS.values())
+
+df = pd.read_csv(DATASETS["nps"])
+df_transaction = pd.read_csv(DATASETS["transaction"])
 
-df_trustpilot = pd.read_csv("datasets/trustpilot_sentiment_final.csv")
+df_trustpilot = pd.read_csv(DATASETS["trustpilot"])
 df_trustpilot_polarity = df_trustpilot.groupby(["date", "polarity"], as_index=False)[
     "score"
 ].mean()
@@ -23,7 +37,7 @@ trustpilot_comments_sort_bad = df_trustpilot.sort_values(by="score")[
     "text"
 ].reset_index(drop=True)
 
-df_twitter = pd.read_csv("datasets/twitter_sentiment_final.csv")
+df_twitter = pd.read_csv(DATASETS["twitter"])
 df_twitter_polarity = df_twitter.groupby(["created_at", "polarity"], as_index=False)[
     "score"
 ].mean()
@@ -31,7 +45,7 @@ twitter_comments_sort_bad = df_twitter.sort_values(by="score")["text"].reset_ind
     drop=True
 )
 
-df_manomano = pd.read_csv("datasets/dataset_sentiment_final.csv")
+df_manomano = pd.read_csv(DATASETS["manomano"])
 df_mano_polarity = df_manomano.groupby(["date", "polarity"], as_index=False)[
     "score"
 ].mean()
@@ -39,164 +53,169 @@ manomano_comments_sort_bad = df_manomano.sort_values(by="score")["comment"].rese
     drop=True
 )
 
-fig_bar = px.bar(
-    df_transaction.sort_values(by="semaine_mois"),
-    x="family",
-    y="bv_transaction",
-    color="nps_respondent",
-    animation_frame="semaine_mois",
-    color_discrete_map={
-        "Promoter": "#488A99",
-        "Passive": "#DBAE58",
-        "Detractor": "#AC3E31",
-    },
-    labels={"nps_respondent": "Customer category"},
-    height=600,
-)
-fig_bar.update_yaxes(showgrid=False)
-fig_bar.update_xaxes(
-    {
-        "categoryorder": "array",
-        "categoryarray": [
-            "Jardin piscine",
-            "Outillage",
-            "Mobilier d'intérieur",
-            "Plomberie chauffage",
-            "Salle de bain, WC",
-            "Quincaillerie",
-            "Electricité",
-            "Luminaire",
-            "Animalerie",
-            "Revêtement sol et mur",
-            "Cuisine",
-            "Construction matériaux",
-        ],
-    }
-)
-fig_bar.update_traces(hovertemplate=None)
-fig_bar.update_layout(
-    margin=dict(t=70, b=70, l=70, r=40),
-    hovermode="x",
-    xaxis_tickangle=45,
-    xaxis_title="Family",
-    yaxis_title="Business volume (total)",
-    plot_bgcolor="white",
-    paper_bgcolor="white",
-    title_font=dict(size=25, color="#a5a7ab", family="Lato, sans-serif"),
-    font=dict(color="#8a8d93"),
-    legend=dict(
-        orientation="h",
-        yanchor="bottom",
-        y=1.02,
-        xanchor="right",
-        x=1,
-        font=dict(size=16),
-    ),
-    xaxis=dict(tickfont=dict(size=15)),
-    yaxis=dict(tickfont=dict(size=15)),
-)
-fig_bar["layout"]["updatemenus"][0]["pad"] = dict(r=10, t=150)
-fig_bar["layout"]["sliders"][0]["pad"] = dict(
-    r=10,
-    t=150,
+SENTIMENT_SOURCES = {
+    "manomano": (df_manomano, df_mano_polarity, "date"),
+    "trustpilot": (df_trustpilot, df_trustpilot_polarity, "date"),
+    "twitter": (df_twitter, df_twitter_polarity, "created_at"),
+}
+
+# FIGURES
+# Built figures are cached per (figure, filter parameters, data version, code
+# version) so repeated views skip the plotly build. Set FIGURE_CACHE_DIR to
+# share them between workers through a local directory.
+figure_cache = FigureCache(
+    max_entries=int(os.environ.get("FIGURE_CACHE_MAX_ENTRIES", 128)),
+    max_bytes=int(os.environ.get("FIGURE_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+    disk_dir=os.environ.get("FIGURE_CACHE_DIR"),
+    schema=code_version(__file__, extra=(plotly.__version__,)),
 )
-fig_bar.layout.updatemenus[0].buttons[0].args[1]["frame"]["duration"] = 3000
-fig_bar.layout.updatemenus[0].buttons[0].args[1]["transition"]["duration"] = 450
-
-fig_nps = go.Figure(
-    go.Indicator(
-        domain={"x": [0, 1], "y": [0, 1]},
-        value=66.03,
-        mode="gauge+number+delta",
-        title={"text": "NPS Total"},
-        delta={"reference": 66.03},
-        gauge={
-            "axis": {"range": [-100, 100]},
-            "bar": {"color": "#DADADA"},
-            "steps": [
-                {"range": [-100, 0], "color": "#AC3E31"},
-                {"range": [0, 50], "color": "#DBAE58"},
-                {"range": [50, 100], "color": "#488A99"},
+
+
+def cached_figure(name, build, **params):
+    return figure_cache.get_or_build(
+        name, params, lambda: build(**params), version=DATA_VERSION
+    )
+
+
+NPS_CATEGORIES = ["Promoter", "Passive", "Detractor"]
+
+
+def build_fig_bar(categories):
+    df_selection = df_transaction[df_transaction["nps_respondent"].isin(categories)]
+    fig_bar = px.bar(
+        df_selection.sort_values(by="semaine_mois"),
+        x="family",
+        y="bv_transaction",
+        color="nps_respondent",
+        animation_frame="semaine_mois",
+        color_discrete_map={
+            "Promoter": "#488A99",
+            "Passive": "#DBAE58",
+            "Detractor": "#AC3E31",
+        },
+        labels={"nps_respondent": "Customer category"},
+        height=600,
+    )
+    fig_bar.update_yaxes(showgrid=False)
+    fig_bar.update_xaxes(
+        {
+            "categoryorder": "array",
+            "categoryarray": [
+                "Jardin piscine",
+                "Outillage",
+                "Mobilier d'intérieur",
+                "Plomberie chauffage",
+                "Salle de bain, WC",
+                "Quincaillerie",
+                "Electricité",
+                "Luminaire",
+                "Animalerie",
+                "Revêtement sol et mur",
+                "Cuisine",
+                "Construction matériaux",
             ],
+        }
+    )
+    fig_bar.update_traces(hovertemplate=None)
+    fig_bar.update_layout(
+        margin=dict(t=70, b=70, l=70, r=40),
+        hovermode="x",
+        xaxis_tickangle=45,
+        xaxis_title="Family",
+        yaxis_title="Business volume (total)",
+        plot_bgcolor="white",
+        paper_bgcolor="white",
+        title_font=dict(size=25, color="#a5a7ab", family="Lato, sans-serif"),
+        font=dict(color="#8a8d93"),
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="right",
+            x=1,
+            font=dict(size=16),
+        ),
+        xaxis=dict(tickfont=dict(size=15)),
+        yaxis=dict(tickfont=dict(size=15)),
+    )
+    fig_bar["layout"]["updatemenus"][0]["pad"] = dict(r=10, t=150)
+    fig_bar["layout"]["sliders"][0]["pad"] = dict(
+        r=10,
+        t=150,
+    )
+    fig_bar.layout.updatemenus[0].buttons[0].args[1]["frame"]["duration"] = 3000
+    fig_bar.layout.updatemenus[0].buttons[0].args[1]["transition"]["duration"] = 450
+    return fig_bar
+
+
+def build_fig_nps():
+    return go.Figure(
+        go.Indicator(
+            domain={"x": [0, 1], "y": [0, 1]},
+            value=66.03,
+            mode="gauge+number+delta",
+            title={"text": "NPS Total"},
+            delta={"reference": 66.03},
+            gauge={
+                "axis": {"range": [-100, 100]},
+                "bar": {"color": "#DADADA"},
+                "steps": [
+                    {"range": [-100, 0], "color": "#AC3E31"},
+                    {"range": [0, 50], "color": "#DBAE58"},
+                    {"range": [50, 100], "color": "#488A99"},
+                ],
+            },
+        )
+    )
+
+
+def build_polarity_histogram(source):
+    df_comments, _, _ = SENTIMENT_SOURCES[source]
+    return px.histogram(
+        df_comments,
+        x="polarity",
+        color="polarity",
+        barmode="group",
+        color_discrete_map={
+            "positive": "#488A99",
+            "neutral": "#DBAE58",
+            "negative": "#AC3E31",
         },
     )
-)
 
-hist_mano = px.histogram(
-    df_manomano,
-    x="polarity",
-    color="polarity",
-    barmode="group",
-    color_discrete_map={
-        "positive": "#488A99",
-        "neutral": "#DBAE58",
-        "negative": "#AC3E31",
-    },
-)
 
-scatter_mano = px.scatter(
-    df_mano_polarity,
-    x="date",
-    y="score",
-    color="polarity",
-    color_discrete_map={
-        "positive": "#488A99",
-        "neutral": "#DBAE58",
-        "negative": "#AC3E31",
-    },
-    labels={"date": "Date [month]", "score": "Sentiment score"},
-)
+def build_polarity_scatter(source):
+    _, df_polarity, date_column = SENTIMENT_SOURCES[source]
+    return px.scatter(
+        df_polarity,
+        x=date_column,
+        y="score",
+        color="polarity",
+        color_discrete_map={
+            "positive": "#488A99",
+            "neutral": "#DBAE58",
+            "negative": "#AC3E31",
+        },
+        labels={date_column: "Date [month]", "score": "Sentiment score"},
+    )
 
-hist_trustpilot = px.histogram(
-    df_trustpilot,
-    x="polarity",
-    color="polarity",
-    barmode="group",
-    color_discrete_map={
-        "positive": "#488A99",
-        "neutral": "#DBAE58",
-        "negative": "#AC3E31",
-    },
-)
 
-scatter_trustpilot = px.scatter(
-    df_trustpilot_polarity,
-    x="date",
-    y="score",
-    color="polarity",
-    color_discrete_map={
-        "positive": "#488A99",
-        "neutral": "#DBAE58",
-        "negative": "#AC3E31",
-    },
-    labels={"date": "Date [month]", "score": "Sentiment score"},
-)
+fig_bar = cached_figure("bar", build_fig_bar, categories=sorted(NPS_CATEGORIES))
+fig_nps = cached_figure("nps", build_fig_nps)
 
-hist_twitter = px.histogram(
-    df_twitter,
-    x="polarity",
-    color="polarity",
-    barmode="group",
-    color_discrete_map={
-        "positive": "#488A99",
-        "neutral": "#DBAE58",
-        "negative": "#AC3E31",
-    },
-)
+hist_mano = cached_figure("histogram", build_polarity_histogram, source="manomano")
+scatter_mano = cached_figure("scatter", build_polarity_scatter, source="manomano")
 
-scatter_twitter = px.scatter(
-    df_twitter_polarity,
-    x="created_at",
-    y="score",
-    color="polarity",
-    color_discrete_map={
-        "positive": "#488A99",
-        "neutral": "#DBAE58",
-        "negative": "#AC3E31",
-    },
-    labels={"created_at": "Date [month]", "score": "Sentiment score"},
+hist_trustpilot = cached_figure(
+    "histogram", build_polarity_histogram, source="trustpilot"
+)
+scatter_trustpilot = cached_figure(
+    "scatter", build_polarity_scatter, source="trustpilot"
 )
 
+hist_twitter = cached_figure("histogram", build_polarity_histogram, source="twitter")
+scatter_twitter = cached_figure("scatter", build_polarity_scatter, source="twitter")
+
 # FRONTEND
 app = Dash(
     __name__,
@@ -292,6 +311,14 @@ app.layout = html.Div(
                                                     "Business volume by product family and customer group over time",
                                                     style={"marginTop": "30px"},
                                                 ),
+                                                dcc.Checklist(
+                                                    id="bar-categories",
+                                                    options=NPS_CATEGORIES,
+                                                    value=NPS_CATEGORIES,
+                                                    inline=True,
+                                                    inputStyle={"marginRight": "5px"},
+                                                    labelStyle={"marginRight": "20px"},
+                                                ),
                                                 dcc.Graph(
                                                     id="graph-1-tabs",
                                                     figure=fig_bar,
@@ -655,5 +682,12 @@ app.layout = html.Div(
 )
 
 
+@app.callback(Output("graph-1-tabs", "figure"), Input("bar-categories", "value"))
+def update_fig_bar(categories):
+    if not categories:
+        raise PreventUpdate
+    return cached_figure("bar", build_fig_bar, categories=sorted(categories))
+
+
 if __name__ == '__main__':
     app.run_server(debug=True)
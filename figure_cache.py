@@ -0,0 +1,227 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import plotly.io as pio
+
+
+class FigureCache:
+    """Process-level LRU cache for plotly figures.
+
+    Entries are keyed by a canonical hash of the figure name, its filter
+    parameters, the data snapshot version and `schema`, a fingerprint of the
+    code and libraries that build the figures. Both the in-memory store and
+    the optional `disk_dir` store are evicted once either `max_entries` or
+    `max_bytes` is exceeded, sizes being the length of the figure's JSON.
+    When `disk_dir` is set, built figures are also written there as JSON so
+    that other workers pointed at the same directory can reuse them.
+
+    Cached figures are shared between requests and must not be mutated.
+    """
+
+    def __init__(
+        self, max_entries=128, max_bytes=64 * 1024 * 1024, disk_dir=None, schema=None
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.schema = schema
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_errors = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def make_key(self, name, params, version):
+        payload = json.dumps(
+            {"name": name, "params": params, "version": version, "schema": self.schema},
+            sort_keys=True,
+            separators=(",", ":"),
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_or_build(self, name, params, build, version=None):
+        key = self.make_key(name, params, version)
+        fig = self._get_memory(key)
+        if fig is not None:
+            return fig
+
+        # Only one caller builds a given key; concurrent callers wait for it
+        # and then pick the figure up from memory. The lock is kept until its
+        # last waiter is done so late callers never get a second one.
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            key_lock[1] += 1
+        try:
+            with key_lock[0]:
+                fig = self._get_memory(key)
+                if fig is not None:
+                    return fig
+                return self._load_or_build(key, build)
+        finally:
+            with self._lock:
+                key_lock[1] -= 1
+                if not key_lock[1]:
+                    del self._key_locks[key]
+
+    def _get_memory(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def _load_or_build(self, key, build):
+        fig, size = self._read_disk(key)
+        if fig is not None:
+            with self._lock:
+                self.disk_hits += 1
+            self._store(key, fig, size)
+            return fig
+
+        fig = build()
+        blob = fig.to_json()
+        if self.disk_dir:
+            self._write_disk(key, blob)
+        with self._lock:
+            self.misses += 1
+        self._store(key, fig, len(blob))
+        return fig
+
+    def _store(self, key, fig, size):
+        with self._lock:
+            if size > self.max_bytes:
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (fig, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key + ".json")
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None, 0
+        path = self._disk_path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                blob = f.read()
+        except (OSError, UnicodeDecodeError):
+            blob = None
+        if blob is None:
+            return None, 0
+        try:
+            fig = pio.from_json(blob)
+        except ValueError:
+            # Truncated, corrupt or written by an incompatible version.
+            with self._lock:
+                self.disk_errors += 1
+            self._remove(path)
+            return None, 0
+        try:
+            # Disk eviction is least recently used by mtime.
+            os.utime(path)
+        except OSError:
+            pass
+        return fig, len(blob)
+
+    def _write_disk(self, key, blob):
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(blob)
+            os.replace(tmp_path, self._disk_path(key))
+            tmp_path = None
+            self._prune_disk()
+        except OSError:
+            with self._lock:
+                self.disk_errors += 1
+        finally:
+            if tmp_path is not None:
+                self._remove(tmp_path)
+
+    def _prune_disk(self):
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        files.sort(reverse=True)
+        total = 0
+        for count, (_, size, path) in enumerate(files, start=1):
+            total += size
+            if count > self.max_entries or total > self.max_bytes:
+                self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def clear(self, disk=False):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if disk and self.disk_dir:
+            for entry in os.scandir(self.disk_dir):
+                if entry.name.endswith((".json", ".tmp")):
+                    self._remove(entry.path)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "disk_errors": self.disk_errors,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+
+def data_version(*paths):
+    """Fingerprint of the dataset files, changes whenever one is rewritten."""
+    digest = hashlib.sha256()
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def code_version(*paths, extra=()):
+    """Fingerprint of source files and library versions that shape the figures."""
+    digest = hashlib.sha256()
+    for value in extra:
+        digest.update(str(value).encode("utf-8"))
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
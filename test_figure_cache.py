@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+import time
+
+import plotly.graph_objs as go
+
+from figure_cache import FigureCache
+
+
+def make_figure(value):
+    return go.Figure(go.Bar(x=["Outillage", "Cuisine"], y=[value, value * 2]))
+
+
+def figure_size(value):
+    return len(make_figure(value).to_json())
+
+
+def builder(value, calls):
+    def build():
+        calls.append(value)
+        return make_figure(value)
+
+    return build
+
+
+def cache_files(path):
+    return [name for name in os.listdir(str(path)) if name.endswith(".json")]
+
+
+def test_hit_after_first_build():
+    cache = FigureCache()
+    calls = []
+    first = cache.get_or_build("bar", {"country": "FR"}, builder(1, calls))
+    second = cache.get_or_build("bar", {"country": "FR"}, builder(2, calls))
+    assert first is second
+    assert calls == [1]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert stats["bytes"] == figure_size(1)
+    assert stats["hit_rate"] == 0.5
+
+
+def test_key_depends_on_params_version_and_schema():
+    cache = FigureCache(schema="a")
+    key = cache.make_key("bar", {"country": "FR", "family": "Outillage"}, "v1")
+    assert key == cache.make_key("bar", {"family": "Outillage", "country": "FR"}, "v1")
+    assert key != cache.make_key("bar", {"country": "DE", "family": "Outillage"}, "v1")
+    assert key != cache.make_key("bar", {"country": "FR", "family": "Outillage"}, "v2")
+    assert key != FigureCache(schema="b").make_key(
+        "bar", {"country": "FR", "family": "Outillage"}, "v1"
+    )
+
+
+def test_evicts_by_count_in_lru_order():
+    cache = FigureCache(max_entries=2)
+    calls = []
+    cache.get_or_build("fig", {"n": 1}, builder(1, calls))
+    cache.get_or_build("fig", {"n": 2}, builder(2, calls))
+    cache.get_or_build("fig", {"n": 1}, builder(1, calls))
+    cache.get_or_build("fig", {"n": 3}, builder(3, calls))
+    cache.get_or_build("fig", {"n": 1}, builder(1, calls))
+    cache.get_or_build("fig", {"n": 2}, builder(2, calls))
+    assert calls == [1, 2, 3, 2]
+    assert cache.stats()["evictions"] == 2
+
+
+def test_evicts_by_bytes():
+    limit = figure_size(1) + figure_size(2)
+    cache = FigureCache(max_bytes=limit)
+    calls = []
+    for n in (1, 2, 3):
+        cache.get_or_build("fig", {"n": n}, builder(n, calls))
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["bytes"] <= limit
+    assert stats["evictions"] == 1
+
+
+def test_rejects_oversize_entry():
+    cache = FigureCache(max_bytes=1)
+    calls = []
+    cache.get_or_build("fig", {}, builder(1, calls))
+    cache.get_or_build("fig", {}, builder(1, calls))
+    assert calls == [1, 1]
+    assert cache.stats()["entries"] == 0
+
+
+def test_disk_round_trip_between_instances(tmp_path):
+    calls = []
+    built = FigureCache(disk_dir=str(tmp_path)).get_or_build(
+        "fig", {}, builder(1, calls)
+    )
+    other = FigureCache(disk_dir=str(tmp_path))
+    loaded = other.get_or_build("fig", {}, builder(2, calls))
+    assert isinstance(loaded, go.Figure)
+    assert json.loads(loaded.to_json()) == json.loads(built.to_json())
+    assert calls == [1]
+    stats = other.stats()
+    assert stats["disk_hits"] == 1
+    assert stats["bytes"] == figure_size(1)
+
+
+def test_recovers_from_corrupt_disk_entry(tmp_path):
+    cache = FigureCache(disk_dir=str(tmp_path))
+    key = cache.make_key("fig", {}, None)
+    with open(os.path.join(str(tmp_path), key + ".json"), "w") as f:
+        f.write('{"data": [{"type": "ba')
+    calls = []
+    assert cache.get_or_build("fig", {}, builder(1, calls)).data[0].y == (1, 2)
+    assert calls == [1]
+    assert cache.stats()["disk_errors"] == 1
+    reloaded = FigureCache(disk_dir=str(tmp_path)).get_or_build(
+        "fig", {}, builder(2, calls)
+    )
+    assert reloaded.data[0].y == (1, 2)
+
+
+def test_disk_store_is_bounded(tmp_path):
+    cache = FigureCache(max_entries=2, disk_dir=str(tmp_path))
+    calls = []
+    for n in (1, 2, 3):
+        cache.get_or_build("fig", {"n": n}, builder(n, calls))
+    assert len(cache_files(tmp_path)) == 2
+
+
+def test_unwritable_disk_does_not_fail_build(tmp_path):
+    cache = FigureCache(disk_dir=str(tmp_path))
+    cache.disk_dir = str(tmp_path / "missing")
+    calls = []
+    assert cache.get_or_build("fig", {}, builder(1, calls)).data[0].y == (1, 2)
+    assert cache.stats()["disk_errors"] == 1
+
+
+def test_concurrent_misses_build_once():
+    cache = FigureCache()
+    calls = []
+
+    def slow_build():
+        calls.append(1)
+        time.sleep(0.05)
+        return make_figure(1)
+
+    threads = [
+        threading.Thread(target=cache.get_or_build, args=("fig", {}, slow_build))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert cache.stats()["misses"] == 1
+
+
+def test_unstored_figure_is_not_built_concurrently():
+    cache = FigureCache(max_bytes=1)
+    running = []
+    overlaps = []
+
+    def slow_build():
+        running.append(1)
+        overlaps.append(len(running))
+        time.sleep(0.02)
+        running.pop()
+        return make_figure(1)
+
+    threads = [
+        threading.Thread(target=cache.get_or_build, args=("fig", {}, slow_build))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(overlaps) == 8
+    assert max(overlaps) == 1
+    assert not cache._key_locks